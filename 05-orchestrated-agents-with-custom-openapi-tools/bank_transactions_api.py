@@ -5,17 +5,29 @@ A simple FastAPI service that provides sample bank transaction data
 and exposes its OpenAPI specification at /openapi.json
 """
 
-from fastapi import FastAPI
-from typing import List, Dict, Any
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
+import functools
+import hashlib
+import os
 import random
 
+import orjson
+
 app = FastAPI(
     title="Bank Transactions API",
     description="Returns sample bank transaction data for demonstration purposes",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Compress JSON bodies for clients that accept gzip; bodies under 256 bytes
+# (including the empty 304 responses) are passed through untouched
+app.add_middleware(GZipMiddleware, minimum_size=256, compresslevel=6)
+
 # Sample bank transaction data
 SAMPLE_TRANSACTIONS = [
     {
@@ -60,21 +72,94 @@ SAMPLE_TRANSACTIONS = [
     }
 ]
 
+# Index transactions by id for constant-time lookups
+SAMPLE_TRANSACTIONS_BY_ID: Dict[str, Dict[str, Any]] = {t["id"]: t for t in SAMPLE_TRANSACTIONS}
+
+# Transaction lookup strategy: "dict" (default) uses the id index above, "scan" walks
+# the list with next() - kept as a baseline for benchmarking the two against each other
+TRANSACTION_LOOKUP = os.environ.get("TRANSACTION_LOOKUP", "dict")
+
+def _find_transaction(transaction_id: str) -> Optional[Dict[str, Any]]:
+    """Look up a transaction by id using the configured strategy"""
+    if TRANSACTION_LOOKUP == "scan":
+        return next((t for t in SAMPLE_TRANSACTIONS if t["id"] == transaction_id), None)
+    return SAMPLE_TRANSACTIONS_BY_ID.get(transaction_id)
+
+# Service information returned by the root endpoint
+SERVICE_INFO = {
+    "service": "Bank Transactions API",
+    "version": "1.0.0",
+    "endpoints": {
+        "transactions": "/transactions",
+        "openapi": "/openapi.json",
+        "docs": "/docs"
+    }
+}
+
+def _etag(body: bytes) -> str:
+    """Build a weak ETag from the response body (weak, since it also covers gzip-encoded copies)"""
+    return f'W/"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"'
+
+# The responses never change, so serialize them and compute their ETags once up front
+_ROOT_JSON = orjson.dumps(SERVICE_INFO)
+_ROOT_ETAG = _etag(_ROOT_JSON)
+_FULL_JSON = orjson.dumps(SAMPLE_TRANSACTIONS)
+_ETAG = _etag(_FULL_JSON)
+
+@functools.lru_cache(maxsize=16)
+def _json_for_limit(limit: int) -> Tuple[bytes, str]:
+    """Return the cached JSON body and ETag for the first `limit` transactions"""
+    if limit >= len(SAMPLE_TRANSACTIONS):
+        return _FULL_JSON, _ETAG
+    body = orjson.dumps(SAMPLE_TRANSACTIONS[:limit])
+    return body, _etag(body)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag: `*` or any listed tag, compared weakly"""
+    if not if_none_match:
+        return False
+    opaque_tag = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque_tag:
+            return True
+    return False
+
+def _cached_json_response(request: Request, body: bytes, etag: str) -> Response:
+    """Return the body, or a bare 304 if the client already holds this version"""
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Handlers stay `async def`: they only touch in-memory data, so running them on the
+# event loop avoids FastAPI dispatching plain `def` handlers to the threadpool.
+# Any blocking setup belongs in a startup event, never in a request handler.
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Root endpoint with service information"""
-    return {
-        "service": "Bank Transactions API",
-        "version": "1.0.0",
-        "endpoints": {
-            "transactions": "/transactions",
-            "openapi": "/openapi.json",
-            "docs": "/docs"
+    return _cached_json_response(request, _ROOT_JSON, _ROOT_ETAG)
+
+# Documents the /transactions response in the OpenAPI spec only; no response_model
+# means FastAPI does not re-validate the returned data on every request
+TRANSACTIONS_RESPONSES: Dict[int, Dict[str, Any]] = {
+    200: {
+        "description": "Successful Response",
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "array",
+                    "items": {"type": "object", "additionalProperties": True}
+                },
+                "example": SAMPLE_TRANSACTIONS
+            }
         }
     }
+}
 
-@app.get("/transactions", response_model=List[Dict[str, Any]])
-async def get_latest_transactions(limit: int = 10):
+@app.get("/transactions", responses=TRANSACTIONS_RESPONSES)
+async def get_latest_transactions(request: Request, limit: int = 10):
     """
     Get the latest bank transactions
     
@@ -85,7 +170,8 @@ async def get_latest_transactions(limit: int = 10):
         List of bank transactions with id, date, description, amount, balance, and category
     """
     # Always return the same sample data for consistency
-    return SAMPLE_TRANSACTIONS[:limit]
+    body, etag = _json_for_limit(limit)
+    return _cached_json_response(request, body, etag)
 
 @app.get("/transactions/{transaction_id}")
 async def get_transaction(transaction_id: str):
@@ -98,11 +184,11 @@ async def get_transaction(transaction_id: str):
     Returns:
         Transaction details or 404 if not found
     """
-    for transaction in SAMPLE_TRANSACTIONS:
-        if transaction["id"] == transaction_id:
-            return transaction
+    transaction = _find_transaction(transaction_id)
+    if transaction is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
     
-    return {"error": "Transaction not found"}, 404
+    return transaction
 
 if __name__ == "__main__":
     import uvicorn
@@ -123,4 +209,14 @@ if __name__ == "__main__":
         print(f"🚀 Starting server on default port {port}")
         print(f"💡 Usage: python {sys.argv[0]} <port_number>")
     
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # uvloop and httptools replace the pure-Python event loop and HTTP parser;
+    # uvloop is not available on Windows, so fall back to asyncio there.
+    # Access logging is disabled to keep log formatting off the request path.
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        access_log=False
+    )
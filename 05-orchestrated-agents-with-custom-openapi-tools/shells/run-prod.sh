@@ -0,0 +1,41 @@
+#!/bin/bash
+
+# Script to run the Bank Transactions API in production with Gunicorn
+# Gunicorn manages several Uvicorn worker processes so requests are spread across
+# CPU cores instead of being serialized on a single interpreter (and its GIL).
+#
+# Worker count follows the usual (2 x CPU cores) + 1 formula: roughly one worker
+# per core serving requests, plus spares to cover workers waiting on I/O.
+# Set WEB_CONCURRENCY to override it.
+
+# CPU cores available to this container. nproc reports the node's CPUs, so use
+# the cgroup CPU quota when one is set (rounded up to whole cores).
+cpu_cores() {
+  local quota period cores
+  if [ -r /sys/fs/cgroup/cpu.max ]; then
+    read -r quota period < /sys/fs/cgroup/cpu.max
+  elif [ -r /sys/fs/cgroup/cpu/cpu.cfs_quota_us ]; then
+    quota=$(cat /sys/fs/cgroup/cpu/cpu.cfs_quota_us)
+    period=$(cat /sys/fs/cgroup/cpu/cpu.cfs_period_us)
+  fi
+  cores=$(nproc)
+  if [[ "$quota" =~ ^[0-9]+$ ]] && [[ "$period" =~ ^[0-9]+$ ]] && [ "$period" -gt 0 ]; then
+    quota=$(( (quota + period - 1) / period ))
+    [ "$quota" -lt "$cores" ] && cores=$quota
+  fi
+  echo "$cores"
+}
+
+PORT="${PORT:-8000}"
+WORKERS="${WEB_CONCURRENCY:-$((2 * $(cpu_cores) + 1))}"
+
+# Run from the directory containing bank_transactions_api.py
+cd "$(dirname "$0")/.." || exit 1
+
+echo "Starting Bank Transactions API on port ${PORT} with ${WORKERS} workers"
+
+exec gunicorn bank_transactions_api:app \
+  --worker-class uvicorn.workers.UvicornWorker \
+  --workers "$WORKERS" \
+  --bind "0.0.0.0:${PORT}" \
+  --keep-alive 5
@@ -2,44 +2,42 @@
 # Voice-controlled agent that can send emails via Logic Apps
 
 # Import necessary libraries and load environment variables
+# Only lightweight modules are imported here; the Azure SDKs, HTTP clients and the
+# voice module are imported where they are first used to keep startup fast
+from __future__ import annotations
+
 import os
 import asyncio
 import json
-import requests
-from datetime import datetime
-from typing import Annotated, Dict, Any, Callable, Set
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Annotated, Dict, Any, Awaitable, Callable, Optional, Set
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv(override=True)
 
-# Import Azure AI Foundry SDK
-from azure.ai.agents import AgentsClient
-from azure.ai.agents.models import ToolSet, FunctionTool
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.logic import LogicManagementClient
-
-# Import our voice module
-from voice import AgentVoice
-
-print("📦 All packages imported successfully!")
-print("🔧 Ready to create voice-enabled email agent!")
-
-# Verify environment variables
+# Environment variables checked at startup
 required_vars = ['PROJECT_ENDPOINT', 'MODEL_DEPLOYMENT_NAME']
 optional_vars = ['AZURE_SUBSCRIPTION_ID', 'AZURE_RESOURCE_GROUP_NAME']
 
-for var in required_vars:
-    if var in os.environ:
-        print(f"✅ {var} is set")
-    else:
-        print(f"❌ {var} is missing!")
 
-for var in optional_vars:
-    if var in os.environ:
-        print(f"✅ {var} is set (for Logic Apps)")
-    else:
-        print(f"⚠️ {var} is missing (Logic Apps features disabled)")
+def _report_env() -> None:
+    """Print which required and optional environment variables are set, in a single write"""
+    lines = ["🔧 Ready to create voice-enabled email agent!"]
+    lines += [f"✅ {var} is set" if var in os.environ else f"❌ {var} is missing!" for var in required_vars]
+    lines += [
+        f"✅ {var} is set (for Logic Apps)" if var in os.environ else f"⚠️ {var} is missing (Logic Apps features disabled)"
+        for var in optional_vars
+    ]
+    print("\n".join(lines))
+
+# Logic App callback URLs are stable for the lifetime of a trigger, so cache them
+# on disk to skip the Azure Resource Manager lookup on every restart
+CALLBACK_URL_CACHE_PATH = Path.home() / ".cache" / "azure-ai-agents-playbook" / "logic_app_callback_urls.json"
+CALLBACK_URL_CACHE_TTL_SECONDS = 24 * 60 * 60
 
 # Azure Logic Apps Tool for Email Functionality
 class EmailLogicAppTool:
@@ -49,9 +47,24 @@ class EmailLogicAppTool:
         self.subscription_id = subscription_id
         self.resource_group = resource_group
         self.callback_urls = {}
+        # Cache key and trigger of each registered Logic App, used to replace a rejected callback URL
+        self._callback_cache_keys = {}
+        self._trigger_names = {}
+
+        import httpx
+
+        # One pooled async client, so successive sends reuse the TLS connection and
+        # don't block the voice event loop
+        self._async_client = httpx.AsyncClient(
+            timeout=30,
+            transport=httpx.AsyncHTTPTransport(http2=True, retries=2),
+        )
         
         if subscription_id and resource_group:
             try:
+                from azure.identity import DefaultAzureCredential
+                from azure.mgmt.logic import LogicManagementClient
+
                 credential = credential or DefaultAzureCredential()
                 self.logic_client = LogicManagementClient(credential, subscription_id)
                 print("✅ Logic Apps client initialized")
@@ -64,6 +77,17 @@ class EmailLogicAppTool:
 
     def register_logic_app(self, logic_app_name: str, trigger_name: str = "When_a_HTTP_request_is_received") -> bool:
         """Register a Logic App for email sending"""
+        cache_key = f"{self.subscription_id}:{self.resource_group}:{logic_app_name}:{trigger_name}"
+        self._callback_cache_keys[logic_app_name] = cache_key
+        self._trigger_names[logic_app_name] = trigger_name
+
+        if self.subscription_id and self.resource_group:
+            cached_url = self._get_cached_callback_url(cache_key)
+            if cached_url:
+                self.callback_urls[logic_app_name] = cached_url
+                print(f"✅ Registered email Logic App: {logic_app_name} (cached callback URL)")
+                return True
+
         if not self.logic_client:
             print("⚠️ Logic Apps client not available")
             return False
@@ -77,6 +101,7 @@ class EmailLogicAppTool:
             
             if callback.value:
                 self.callback_urls[logic_app_name] = callback.value
+                self._set_cached_callback_url(cache_key, callback.value)
                 print(f"✅ Registered email Logic App: {logic_app_name}")
                 return True
             else:
@@ -88,22 +113,30 @@ class EmailLogicAppTool:
         
         return False
 
-    def invoke_logic_app(self, recipient: str, subject: str, body: str, logic_app_name: str = "agent-logic-apps") -> Dict[str, Any]:
+    async def invoke_logic_app(self, recipient: str, subject: str, body: str, logic_app_name: str = "agent-logic-apps") -> Dict[str, Any]:
         """Send email via Logic Apps or simulate if not configured"""
         
+        # UTC, second precision - enough for an email timestamp and cheaper to format
+        timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
         if logic_app_name in self.callback_urls:
             # Send via actual Logic App
             try:
-                payload = {
-                    "to": recipient,
-                    "subject": subject,
-                    "body": body,
-                    "timestamp": datetime.now().isoformat()
-                }
+                payload = self._email_payload(recipient, subject, body, timestamp)
+                response = await self._async_client.post(self.callback_urls[logic_app_name], json=payload)
                 
-                response = requests.post(url=self.callback_urls[logic_app_name], json=payload, timeout=30)
-                
-                if response.ok:
+                if response.status_code in (401, 403):
+                    # The callback URL's signature was rejected (e.g. its keys were
+                    # regenerated): fetch a fresh URL and retry once
+                    stale_url = self.callback_urls[logic_app_name]
+                    self._invalidate_callback_url(logic_app_name)
+                    registered = await asyncio.to_thread(
+                        self.register_logic_app, logic_app_name, self._trigger_names[logic_app_name]
+                    )
+                    if registered and self.callback_urls[logic_app_name] != stale_url:
+                        response = await self._async_client.post(self.callback_urls[logic_app_name], json=payload)
+
+                if response.is_success:
                     return {"status": "success", "message": f"Email sent to {recipient} via Logic Apps"}
                 else:
                     return {"status": "error", "message": f"Logic App failed: {response.status_code}"}
@@ -111,32 +144,89 @@ class EmailLogicAppTool:
             except Exception as e:
                 return {"status": "error", "message": f"Email sending failed: {str(e)}"}
         else:
-            # Simulate email sending
-            print(f"📧 SIMULATED EMAIL:")
-            print(f"   To: {recipient}")
-            print(f"   Subject: {subject}")
-            print(f"   Body: {body}")
-            print(f"   Timestamp: {datetime.now()}")
-            return {"status": "simulated", "message": f"Email simulated (sent to {recipient})"}
+            return self._simulate_email(recipient, subject, body, timestamp)
 
+    async def aclose(self) -> None:
+        """Close the HTTP client used to call Logic Apps"""
+        await self._async_client.aclose()
 
-def create_send_email_function(service: EmailLogicAppTool, logic_app_name: str) -> Callable[[str, str, str], str]:
+    @staticmethod
+    def _load_callback_cache() -> Dict[str, Any]:
+        try:
+            cache = json.loads(CALLBACK_URL_CACHE_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    @staticmethod
+    def _save_callback_cache(cache: Dict[str, Any]) -> None:
+        tmp_path = CALLBACK_URL_CACHE_PATH.with_name(CALLBACK_URL_CACHE_PATH.name + ".tmp")
+        try:
+            CALLBACK_URL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            # Callback URLs carry a SAS signature, so the file is created readable by the
+            # current user only and moved into place once written
+            tmp_path.unlink(missing_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, CALLBACK_URL_CACHE_PATH)
+        except OSError as e:
+            print(f"⚠️ Could not write Logic App callback URL cache: {e}")
+
+    def _get_cached_callback_url(self, cache_key: str) -> Optional[str]:
+        entry = self._load_callback_cache().get(cache_key)
+        if isinstance(entry, dict) and time.time() - entry.get("cached_at", 0) < CALLBACK_URL_CACHE_TTL_SECONDS:
+            return entry.get("url")
+        return None
+
+    def _set_cached_callback_url(self, cache_key: str, url: str) -> None:
+        cache = self._load_callback_cache()
+        cache[cache_key] = {"url": url, "cached_at": time.time()}
+        self._save_callback_cache(cache)
+
+    def _invalidate_callback_url(self, logic_app_name: str) -> None:
+        """Drop a rejected callback URL from the disk cache so registering again fetches a fresh one"""
+        cache_key = self._callback_cache_keys.get(logic_app_name)
+        cache = self._load_callback_cache()
+        if cache_key and cache.pop(cache_key, None) is not None:
+            self._save_callback_cache(cache)
+
+    @staticmethod
+    def _email_payload(recipient: str, subject: str, body: str, timestamp: str) -> Dict[str, Any]:
+        return {
+            "to": recipient,
+            "subject": subject,
+            "body": body,
+            "timestamp": timestamp
+        }
+
+    @staticmethod
+    def _simulate_email(recipient: str, subject: str, body: str, timestamp: str) -> Dict[str, Any]:
+        # Simulate email sending
+        print(f"📧 SIMULATED EMAIL:")
+        print(f"   To: {recipient}")
+        print(f"   Subject: {subject}")
+        print(f"   Body: {body}")
+        print(f"   Timestamp: {timestamp}")
+        return {"status": "simulated", "message": f"Email simulated (sent to {recipient})"}
+
+
+def create_send_email_function(service: EmailLogicAppTool, logic_app_name: str) -> Callable[[str, str, str], Awaitable[str]]:
     """
-    Returns a function that sends an email by invoking the specified Logic App.
+    Returns a coroutine function that sends an email by invoking the specified Logic App.
     """
-    def send_email_via_logic_app(to: str, subject: str, body: str) -> str:
+    async def send_email_via_logic_app(to: str, subject: str, body: str) -> str:
         """
         Sends an email by invoking the specified Logic App with the given recipient, subject, and body.
         """
-        result = service.invoke_logic_app(to, subject, body, logic_app_name)
-        return json.dumps(result)
+        result = await service.invoke_logic_app(to, subject, body, logic_app_name)
+        # Tool outputs are passed to the agent with str(), so they must already be JSON text
+        return orjson.dumps(result).decode()
 
     return send_email_via_logic_app
 
 
 
-print("✅ Email tool ready!")
-
 # Step 2: Create a voice-controlled email agent
 async def create_email_agent():
     """Create an Azure AI agent with email capabilities."""
@@ -150,8 +240,13 @@ async def create_email_agent():
     if not model_deployment_name or not endpoint:
         raise ValueError("Missing required environment variables: MODEL_DEPLOYMENT_NAME and PROJECT_ENDPOINT")
 
+    # Import Azure AI Foundry SDK
+    from azure.ai.agents.aio import AgentsClient
+    from azure.ai.agents.models import AsyncToolSet, AsyncFunctionTool
+    from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+
     # Create the email tool instance
-    credential = DefaultAzureCredential()
+    credential = AsyncDefaultAzureCredential()
     agents_client = AgentsClient(endpoint=endpoint, credential=credential)
 
     # Initialize email tool
@@ -182,16 +277,16 @@ async def create_email_agent():
     }
 
     # Create agent with proper toolset
-    with agents_client:
-        # Create function tool and toolset
-        functions = FunctionTool(functions=functions_to_use)
-        toolset = ToolSet()
+    async with credential, agents_client:
+        # Create function tool and toolset (async, so the tool can await the Logic App call)
+        functions = AsyncFunctionTool(functions=functions_to_use)
+        toolset = AsyncToolSet()
         toolset.add(functions)
 
         # Enable auto function calls - this is key for actual execution
         agents_client.enable_auto_function_calls(toolset)
 
-        agent = agents_client.create_agent(
+        agent = await agents_client.create_agent(
             model=model_deployment_name,
             name="voice-email-assistant",
             instructions="""You are a helpful voice-controlled email assistant. 
@@ -229,7 +324,7 @@ The available emails for you to use are:
     print(f"🔧 Agent has email sending capabilities")
     print(f"🆔 Agent ID: {agent.id}")
     
-    return agent, agents_client
+    return agent, agents_client, logic_app_tool
 
 async def main():
     """Main function to run the voice-activated email assistant demo."""
@@ -237,13 +332,15 @@ async def main():
     print("🎙️ Starting Voice-Activated Email Assistant Demo")
     print("=" * 60)
     
+    logic_app_tool = None
     try:
         # Create the email agent
         print("Creating email agent with Logic Apps integration...")
-        agent, agents_client = await create_email_agent()
+        agent, agents_client, logic_app_tool = await create_email_agent()
         
         # Create voice interface with the agent  
         print("\n🎤 Setting up voice interface...")
+        from voice import AgentVoice
         av = AgentVoice(agent_id=agent.id)
         
         print("\n🗣️ Voice interface ready!")
@@ -268,17 +365,27 @@ async def main():
         traceback.print_exc()
     
     finally:
+        if logic_app_tool is not None:
+            await logic_app_tool.aclose()
         print("\n👋 Demo completed!")
 
 if __name__ == "__main__":
+    _report_env()
+
     print("\n" + "=" * 60)
     print("🎙️ VOICE-CONTROLLED EMAIL ASSISTANT")
     print("Features: Send emails via Logic Apps with voice commands")
     print("=" * 60)
     
-    # Run the main demo
+    # Run the main demo, on uvloop's faster event loop where available
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:
+        run = asyncio.run
+
     try:
-        asyncio.run(main())
+        run(main())
     except KeyboardInterrupt:
         print("\n🛑 Demo interrupted by user")
     except Exception as e:
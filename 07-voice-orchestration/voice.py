@@ -2,13 +2,15 @@
 from __future__ import annotations
 
 import os
+import time
 import uuid
-import json
 import asyncio
-import base64
+import functools
 import logging
 import threading
 import numpy as np
+import orjson
+import pybase64
 import sounddevice as sd
 
 from dotenv import load_dotenv
@@ -18,13 +20,16 @@ from websockets.asyncio.client import connect as ws_connect
 from websockets.asyncio.client import ClientConnection as AsyncWebsocket
 from websockets.asyncio.client import HeadersLike
 from websockets.typing import Data
-from websockets.exceptions import WebSocketException
-from azure.identity import DefaultAzureCredential
+from websockets.exceptions import ConnectionClosedOK, WebSocketException
+from azure.core.credentials import AccessToken
 from azure.core.credentials_async import AsyncTokenCredential
 from azure.identity import DefaultAzureCredential
 
 logger = logging.getLogger(__name__)
 AUDIO_SAMPLE_RATE = 24000
+# Default bound on audio queued for playback; the oldest audio is dropped beyond it.
+# Responses are streamed faster than real time, so this must hold a whole reply.
+AUDIO_PLAYER_BUFFER_SECONDS = 60
 
 AudioTimestampTypes = Literal["word"]
 
@@ -74,25 +79,46 @@ class AsyncVoiceLiveSessionResource:
         session: Session,
         event_id: str | None = None,
     ) -> None:
+        if session is _SESSION_TEMPLATE_DICT and event_id is None:
+            # Constant default session, already serialized
+            await self._connection.send(_SESSION_TEMPLATE)
+            return
         param: SessionUpdateEventParam = {
             "type": "session.update", "session": session, "event_id": event_id
         }
-        data = json.dumps(param)
+        data = orjson.dumps(param).decode()
         await self._connection.send(data)
 
 class AsyncVoiceLiveConnection:
     session: AsyncVoiceLiveSessionResource
     _connection: AsyncWebsocket
 
-    def __init__(self, url: str, additional_headers: HeadersLike) -> None:
+    def __init__(
+        self,
+        url: str | None,
+        additional_headers: HeadersLike | None,
+        *,
+        resolve_endpoint: Callable[[], Awaitable[tuple[str, HeadersLike]]] | None = None,
+    ) -> None:
         self._url = url
         self._additional_headers = additional_headers
+        # Called on enter to produce the url and headers, for endpoints that need
+        # credentials which are fetched asynchronously
+        self._resolve_endpoint = resolve_endpoint
         self._connection = None
         self.session = AsyncVoiceLiveSessionResource(self)
 
     async def __aenter__(self) -> AsyncVoiceLiveConnection:
+        if self._resolve_endpoint is not None:
+            self._url, self._additional_headers = await self._resolve_endpoint()
         try:
-            self._connection = await ws_connect(self._url, additional_headers=self._additional_headers)
+            # Audio travels as base64 text that barely compresses, so skip permessage-deflate
+            self._connection = await ws_connect(
+                self._url,
+                additional_headers=self._additional_headers,
+                compression=None,
+                max_queue=64,
+            )
         except WebSocketException as e:
             raise ValueError(f"Failed to establish a WebSocket connection: {e}")
         return self
@@ -105,20 +131,43 @@ class AsyncVoiceLiveConnection:
     enter = __aenter__
     close = __aexit__
 
-    async def __aiter__(self) -> AsyncIterator[Data]:
-        async for data in self._connection:
-            yield data
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        # Yield frames as raw bytes: text frames skip UTF-8 decoding, and the
+        # events are parsed with orjson, which reads bytes directly
+        try:
+            while True:
+                yield await self._connection.recv(decode=False)
+        except ConnectionClosedOK:
+            return
 
     async def recv(self) -> Data:
         return await self._connection.recv()
     
     async def recv_bytes(self) -> bytes:
-        return await self._connection.recv()
+        return await self._connection.recv(decode=False)
 
     async def send(self, message: Data) -> None:
         await self._connection.send(message)
 
 
+# Tokens are reused until they are this close to expiring
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+_token_cache: Dict[tuple, AccessToken] = {}
+
+@functools.lru_cache(maxsize=None)
+def get_default_credential() -> DefaultAzureCredential:
+    """Process-wide DefaultAzureCredential, so the credential chain is only resolved once"""
+    return DefaultAzureCredential()
+
+def get_cached_token(credential, scope: str) -> str:
+    """Return a token for `scope`, only asking the credential again when the cached one nears expiry"""
+    key = (credential, scope)
+    token = _token_cache.get(key)
+    if token is None or token.expires_on - time.time() < TOKEN_REFRESH_MARGIN_SECONDS:
+        token = credential.get_token(scope)
+        _token_cache[key] = token
+    return token.token
+
 class AsyncAzureVoiceLive:
     def __init__(
         self,
@@ -160,36 +209,35 @@ class AsyncAzureVoiceLive:
         self._azure_ad_token_credential = azure_ad_token_credential
         self._foundry_credential = foundry_credential
         self._connection = None
-        self._token = self.get_token() if azure_ad_token_credential else None
-        self._foundry_token = self.get_foundry_token() if foundry_credential else None
+        # Tokens are fetched when connecting, see _ensure_token
+        self._token = None
+        self._foundry_token = None
 
     def get_token(self) -> str:
         if self._azure_ad_token_credential:
             scopes = "https://cognitiveservices.azure.com/.default"
-            token = self._azure_ad_token_credential.get_token(scopes)
-            return token.token
+            return get_cached_token(self._azure_ad_token_credential, scopes)
         else:
             return None
         
     def get_foundry_token(self) -> str:
         if self._foundry_credential:
             scopes = "https://ai.azure.com"
-            token = self._foundry_credential.get_token(scopes)
-            return token.token
+            return get_cached_token(self._foundry_credential, scopes)
         else:
             return None        
 
-    def refresh_token(self) -> None:
-        self._token = self.get_token()
-
-    def connect(self, model: str, agent_id: str = None) -> AsyncVoiceLiveConnection:
-        if self._connection is not None:
-            raise ValueError("Already connected to the Azure Voice Agent service.")
-        if not model:
-            raise ValueError("Model name is required.")
-        if not isinstance(model, str):
-            raise TypeError(f"The 'model' parameter must be of type 'str', but got {type(model).__name__}.")
+    async def _ensure_token(self) -> None:
+        # Credential calls block on network I/O, so run them in worker threads
+        # rather than on the event loop, fetching both tokens concurrently
+        if self._token is None or self._foundry_token is None:
+            self._token, self._foundry_token = await asyncio.gather(
+                asyncio.to_thread(self.get_token),
+                asyncio.to_thread(self.get_foundry_token),
+            )
 
+    async def _endpoint(self, model: str, agent_id: str | None) -> tuple[str, HeadersLike]:
+        await self._ensure_token()
 
         request_id = uuid.uuid4()
 
@@ -199,20 +247,59 @@ class AsyncAzureVoiceLive:
 
         auth_header = {"Authorization": f"Bearer {self._token}"} if self._token else {"api-key": self._api_key}        
         headers = {"x-ms-client-request-id": str(request_id), **auth_header}
+        return url, headers
 
+    def connect(self, model: str, agent_id: str = None) -> AsyncVoiceLiveConnection:
+        if self._connection is not None:
+            raise ValueError("Already connected to the Azure Voice Agent service.")
+        if not model:
+            raise ValueError("Model name is required.")
+        if not isinstance(model, str):
+            raise TypeError(f"The 'model' parameter must be of type 'str', but got {type(model).__name__}.")
+
+        # The url and headers carry the tokens, so they are built when the
+        # connection is entered, once the tokens have been fetched
         self._connection = AsyncVoiceLiveConnection(
-            url,
-            additional_headers=headers,
+            None,
+            additional_headers=None,
+            resolve_endpoint=functools.partial(self._endpoint, model, agent_id),
         )
         return self._connection
 
 
 # --- End of Embedded Code ---
 
+def _read_ring(out: np.ndarray, ring: np.ndarray, head: int, n: int) -> int:
+    """Copy `n` samples starting at `head` from the ring into `out`, zero-fill the rest and return the new head"""
+    size = ring.shape[0]
+    first = min(n, size - head)
+    out[:first] = ring[head:head + first]
+    out[first:n] = ring[:n - first]
+    out[n:] = 0
+    return (head + n) % size
+
+# When numba is installed, compile the copy to native code that runs without the GIL,
+# keeping the PortAudio thread out of the interpreter while it fills a block
+try:
+    from numba import njit
+    _read_ring = njit(nogil=True, cache=True)(_read_ring)
+except ImportError:
+    pass
+
 class AudioPlayerAsync:
-    def __init__(self):
-        self.queue = []
+    def __init__(self, max_buffered_seconds: float = AUDIO_PLAYER_BUFFER_SECONDS):
+        # Preallocated ring buffer of int16 samples: the audio callback only copies
+        # slices out of it, so it never allocates on the real-time thread. Its size
+        # is the bound on queued audio.
+        self._ring = np.zeros(int(AUDIO_SAMPLE_RATE * max_buffered_seconds), dtype=np.int16)
+        # Byte view of the same memory, so incoming PCM is copied in without an ndarray per chunk
+        self._ring_bytes = memoryview(self._ring).cast("B")
+        self._head = 0   # index of the next sample to play
+        self._count = 0  # number of samples queued for playback
         self.lock = threading.Lock()
+        # Trigger any JIT compilation here rather than on the first audio callback,
+        # using the same array layout as the callback's outdata[:, 0]
+        _read_ring(np.zeros((1, 1), dtype=np.int16)[:, 0], self._ring, 0, 0)
         self.stream = sd.OutputStream(
             callback=self.callback,
             samplerate=AUDIO_SAMPLE_RATE,
@@ -224,21 +311,32 @@ class AudioPlayerAsync:
 
     def callback(self, outdata, frames, time, status):
         with self.lock:
-            data = np.empty(0, dtype=np.int16)
-            while len(data) < frames and len(self.queue) > 0:
-                item = self.queue.pop(0)
-                frames_needed = frames - len(data)
-                data = np.concatenate((data, item[:frames_needed]))
-                if len(item) > frames_needed:
-                    self.queue.insert(0, item[frames_needed:])
-            if len(data) < frames:
-                data = np.concatenate((data, np.zeros(frames - len(data), dtype=np.int16)))
-        outdata[:] = data.reshape(-1, 1)
+            n = min(frames, self._count)
+            self._head = _read_ring(outdata[:, 0], self._ring, self._head, n)
+            self._count -= n
+
+    def _write(self, data: bytes) -> None:
+        # Must be called with self.lock held; data is 16-bit PCM
+        data = memoryview(data)
+        size = self._ring.size
+        n = len(data) // 2
+        if n > size:
+            data = data[2 * (n - size):]
+            n = size
+        overflow = self._count + n - size
+        if overflow > 0:
+            logger.warning(f"Playback buffer full, dropping {overflow} samples")
+            self._head = (self._head + overflow) % size
+            self._count -= overflow
+        tail = (self._head + self._count) % size
+        first = min(n, size - tail)
+        self._ring_bytes[2 * tail:2 * (tail + first)] = data[:2 * first]
+        self._ring_bytes[:2 * (n - first)] = data[2 * first:2 * n]
+        self._count += n
 
     def add_data(self, data: bytes):
         with self.lock:
-            np_data = np.frombuffer(data, dtype=np.int16)
-            self.queue.append(np_data)
+            self._write(data)
             if not self.playing:
                 self.start()
 
@@ -248,27 +346,58 @@ class AudioPlayerAsync:
 
     def stop(self):
         with self.lock:
-            self.queue = []
+            self._head = 0
+            self._count = 0
         self.playing = False
         self.stream.stop()
 
     def terminate(self):
         self.stream.close()
 
+# input_audio_buffer.append event with the audio field left open; only the base64
+# body changes per chunk, so the JSON is assembled by concatenation instead of json.dumps
+_AUDIO_APPEND_PREFIX = b'{"type":"input_audio_buffer.append","audio":"'
+_AUDIO_APPEND_SUFFIX = b'","event_id":""}'
+
+# Microphone blocks (20 ms each) that may wait to be sent; if sending stalls for
+# longer than this, new blocks are dropped rather than queued without bound
+_MIC_QUEUE_MAX_BLOCKS = 50
+
 async def listen_and_send_audio(connection: AsyncVoiceLiveConnection) -> None:
     logger.info("Starting audio stream ...")
 
-    stream = sd.InputStream(channels=1, samplerate=AUDIO_SAMPLE_RATE, dtype="int16")
+    # PortAudio invokes the callback on its own thread every 20 ms; hand each block
+    # to the event loop through a queue so this task sleeps until audio is available
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=_MIC_QUEUE_MAX_BLOCKS)
+    dropped_blocks = 0
+
+    def enqueue(block: bytes) -> None:
+        # Runs on the event loop
+        nonlocal dropped_blocks
+        try:
+            queue.put_nowait(block)
+        except asyncio.QueueFull:
+            if dropped_blocks == 0:
+                logger.warning("Audio send is falling behind, dropping microphone audio")
+            dropped_blocks += 1
+
+    def callback(indata, frames, time, status):
+        loop.call_soon_threadsafe(enqueue, bytes(indata))
+
+    stream = sd.RawInputStream(
+        channels=1,
+        samplerate=AUDIO_SAMPLE_RATE,
+        dtype="int16",
+        blocksize=int(AUDIO_SAMPLE_RATE * 0.02),
+        callback=callback,
+    )
     try:
         stream.start()
-        read_size = int(AUDIO_SAMPLE_RATE * 0.02)
         while True:
-            if stream.read_available < read_size:
-                continue
-            data, _ = stream.read(read_size)
-            audio = base64.b64encode(data).decode("utf-8")
-            param = {"type": "input_audio_buffer.append", "audio": audio, "event_id": ""}
-            data_json = json.dumps(param)
+            data = await queue.get()
+            # base64 output is plain ASCII, so the event can be sent as a text frame as-is
+            data_json = (_AUDIO_APPEND_PREFIX + pybase64.b64encode(data) + _AUDIO_APPEND_SUFFIX).decode("ascii")
             try:
                 await connection.send(data_json)
             except (ConnectionResetError, WebSocketException) as e:
@@ -279,11 +408,35 @@ async def listen_and_send_audio(connection: AsyncVoiceLiveConnection) -> None:
     finally:
         stream.stop()
         stream.close()
+        if dropped_blocks:
+            logger.warning(f"Dropped {dropped_blocks} microphone blocks while sending was stalled")
         logger.info("Audio stream closed.")
 
+# Upper bound on decoded audio batched into one add_data call
+_PLAYBACK_BATCH_BYTES = 16 * 1024
+
 async def receive_audio_and_playback(connection: AsyncVoiceLiveConnection) -> None:
     last_audio_item_id = None
     audio_player = AudioPlayerAsync()
+    loop = asyncio.get_running_loop()
+    # Audio deltas already received in the same event loop iteration are handed to the
+    # player in one add_data call (one lock). Deltas are decoded one by one (their
+    # base64 may end in padding, so the strings can't be joined before decoding) and
+    # the raw PCM bytes are joined on flush.
+    pending_audio: list[bytes] = []
+    pending_bytes = 0
+    flush_handle: asyncio.Handle | None = None
+
+    def flush_audio() -> None:
+        nonlocal pending_bytes, flush_handle
+        if flush_handle is not None:
+            flush_handle.cancel()
+            flush_handle = None
+        if pending_audio:
+            # The player bounds its queue, dropping the oldest audio when full
+            audio_player.add_data(b"".join(pending_audio))
+            pending_audio.clear()
+            pending_bytes = 0
 
     logger.info("Starting audio playback ...")
     try:
@@ -291,26 +444,41 @@ async def receive_audio_and_playback(connection: AsyncVoiceLiveConnection) -> No
             transcript = ""
             async for raw_event in connection:
                 try:
-                    event = json.loads(raw_event)
-                except json.JSONDecodeError as e:
+                    event = orjson.loads(raw_event)
+                except orjson.JSONDecodeError as e:
                     logger.error(f"Failed to decode event: {e}")
                     break
 
+                if event.get("type") != "response.audio.delta":
+                    # Any other event ends the current run of audio deltas
+                    flush_audio()
+
                 if event.get("type") == "response.audio.delta":
                     if event.get("item_id") != last_audio_item_id:
+                        flush_audio()
                         last_audio_item_id = event.get("item_id")
-                    bytes_data = base64.b64decode(event.get("delta", ""))
-                    audio_player.add_data(bytes_data)
+                    bytes_data = pybase64.b64decode(event.get("delta", ""), validate=False)
+                    pending_audio.append(bytes_data)
+                    pending_bytes += len(bytes_data)
+                    if pending_bytes >= _PLAYBACK_BATCH_BYTES:
+                        flush_audio()
+                    elif flush_handle is None:
+                        # Receiving a buffered frame doesn't yield to the event loop, so
+                        # this runs once no more frames are ready, before waiting for one
+                        flush_handle = loop.call_soon(flush_audio)
                 elif event.get("type") == "response.audio_transcript.delta":
                     transcript += event.get("delta", "")
                 elif event.get("type") == "response.done":
                     print(f"Final Transcript: {transcript}")
                     break
+            flush_audio()
     except (ConnectionResetError, WebSocketException) as e:
         logger.error(f"WebSocket error in audio playback: {e}")
     except Exception as e:
         logger.error(f"Error in audio playback: {e}")
     finally:
+        if flush_handle is not None:
+            flush_handle.cancel()
         audio_player.terminate()
         logger.info("Playback done.")
 
@@ -326,6 +494,48 @@ async def read_keyboard_and_quit() -> None:
 
 
 
+# Session configuration sent when AgentVoice connects. It never changes, so the
+# session.update event is serialized once at import and reused by
+# AsyncVoiceLiveSessionResource.update
+_SESSION_TEMPLATE_DICT: Session = {
+    "turn_detection": {
+        "create_response": True,
+        "interrupt_response": True,
+        "type": "azure_semantic_vad",
+        "threshold": 0.5,
+        "prefix_padding_ms": 400,
+        "silence_duration_ms": 400,
+        "remove_filler_words": True,
+        "end_of_utterance_detection": {
+            "model": "semantic_detection_v1",
+            "threshold": 0.01,
+            "timeout": 3,
+        },
+    },
+    "input_audio_transcription": {"model": "azure-fast-transcription"},
+    "input_audio_noise_reduction": {"type": "azure_deep_noise_suppression"},
+    "input_audio_echo_cancellation": {"type": "server_echo_cancellation"},
+    "voice": {
+        "name": "en-US-Aria:DragonHDLatestNeural",
+        "type": "azure-standard",
+        "temperature": 0.3,
+    },
+    # "model": "gpt-4.1",
+    "modalities": ["audio", "text"],
+    "tool_choice": "auto",
+    # "agent":{
+    #     "type": "agent",
+    #     "name": "test_research_agent",
+    #     "description": "Research agent for testing purposes",
+    #     "agent_id": agent_id,
+    #     "thread_id": ""
+    # }
+}
+_SESSION_TEMPLATE = orjson.dumps(
+    {"type": "session.update", "session": _SESSION_TEMPLATE_DICT, "event_id": None}
+).decode()
+
+
 class AgentVoice():
 
     def __init__(self, 
@@ -352,52 +562,18 @@ class AgentVoice():
         return f"AgentVoice(agent_id={self.agent_id}, project_name={self.project_name})"
 
     async def connect(self) -> None:
+        credential = get_default_credential()
         client = AsyncAzureVoiceLive(
             azure_endpoint = self.endpoint,
             # api_key = self.api_key,
-            azure_ad_token_credential=DefaultAzureCredential(),
-            foundry_credential=DefaultAzureCredential(),
+            azure_ad_token_credential=credential,
+            foundry_credential=credential,
             project_name = self.project_name,
             agent_id = self.agent_id,
         )
 
         async with client.connect(model = self.deployment) as connection:
-            await connection.session.update(
-                session={
-                    "turn_detection": {
-                        "create_response": True,
-                        "interrupt_response": True,
-                        "type": "azure_semantic_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 400,
-                        "silence_duration_ms": 400,
-                        "remove_filler_words": True,
-                        "end_of_utterance_detection": {
-                            "model": "semantic_detection_v1",
-                            "threshold": 0.01,
-                            "timeout": 3,
-                        },
-                    },
-                    "input_audio_transcription": {"model": "azure-fast-transcription"},     
-                    "input_audio_noise_reduction": {"type": "azure_deep_noise_suppression"},
-                    "input_audio_echo_cancellation": {"type": "server_echo_cancellation"},
-                    "voice": {
-                        "name": "en-US-Aria:DragonHDLatestNeural",
-                        "type": "azure-standard",
-                        "temperature": 0.3,
-                    },      
-                    # "model": "gpt-4.1",
-                    "modalities": ["audio", "text"],
-                    "tool_choice": "auto",
-                    # "agent":{
-                    #     "type": "agent",
-                    #     "name": "test_research_agent",
-                    #     "description": "Research agent for testing purposes",
-                    #     "agent_id": agent_id,
-                    #     "thread_id": ""
-                    # }
-                }
-            )
+            await connection.session.update(session=_SESSION_TEMPLATE_DICT)
 
             send_task = asyncio.create_task(listen_and_send_audio(connection))
             receive_task = asyncio.create_task(receive_audio_and_playback(connection))
@@ -414,7 +590,13 @@ if __name__ == "__main__":
     try:
         load_dotenv()
         av = AgentVoice(agent_id="asst_bEgFu4ATuu5XvMjHBP3y85ac")
-        asyncio.run(av.connect())
+        # Prefer uvloop's libuv-based event loop for faster websocket I/O where available
+        try:
+            import uvloop
+            run = uvloop.run
+        except ImportError:
+            run = asyncio.run
+        run(av.connect())
     except Exception as e:
         print(f"Error: {e}")
         
\ No newline at end of file
@@ -11,53 +11,281 @@ Usage:
 
 The script will:
 1. Discover all .ipynb files in the workspace
-2. Execute each notebook in order
+2. Execute the notebooks in parallel worker processes
 3. Track execution time and success/failure status
 4. Generate a detailed report
 5. Exit with appropriate status code for CI/CD integration
 """
 
 import argparse
+import itertools
 import json
 import logging
+import mmap
 import os
 import subprocess
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 
 import nbformat
+from jupyter_client import KernelManager
 from nbconvert.preprocessors import ExecutePreprocessor
 from nbconvert.preprocessors.execute import CellExecutionError
 
 
+# Notebooks that use shared local resources (e.g. a fixed server port) and therefore
+# must not run alongside other notebooks. Paths are relative to the root path.
+SERIAL_NOTEBOOKS = {
+    "05-orchestrated-agents-with-custom-openapi-tools/05.1-fastapi_openapi_tutorial.ipynb",
+}
+
+
+# Directories that are never searched for notebooks
+EXCLUDED_DIRS = {".git", "node_modules", ".venv", "build", ".ipynb_checkpoints"}
+
+
+def walk_notebooks(root: Path, exclude: set = EXCLUDED_DIRS) -> Iterator[Path]:
+    """
+    Yield .ipynb files below root, pruning excluded directories before descending into them.
+    
+    Args:
+        root: Directory to search
+        exclude: Directory names to skip entirely
+        
+    Yields:
+        Paths of notebook files
+    """
+    try:
+        entries = os.scandir(root)
+    except OSError:
+        # Skip unreadable directories, as Path.rglob does
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in exclude:
+                    yield from walk_notebooks(Path(entry.path), exclude)
+            elif entry.name.endswith(".ipynb") and entry.is_file():
+                yield Path(entry.path)
+
+
+class CountingExecutePreprocessor(ExecutePreprocessor):
+    """ExecutePreprocessor that counts the code cells it executes as it goes."""
+    
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.executed_cells = 0
+    
+    def preprocess_cell(self, cell, resources, index):
+        cell, resources = super().preprocess_cell(cell, resources, index)
+        if cell.cell_type == "code" and cell.get("execution_count") is not None:
+            self.executed_cells += 1
+        return cell, resources
+
+
+def configure_logging():
+    """Configure logging to the runner log file and stdout."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('notebook_test_runner.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+
+def _new_result(notebook_path: Path) -> Dict:
+    """Result record for a notebook, filled in as it executes."""
+    return {
+        "notebook": str(notebook_path.relative_to(Path.cwd())),
+        "status": "unknown",
+        "execution_time": 0,
+        "start_time": datetime.now().isoformat(),
+        "end_time": None,
+        "error_message": None,
+        "cells_executed": 0,
+        "total_cells": 0
+    }
+
+
+def _error_result(notebook_path: Path, message: str) -> Dict:
+    """Result for a notebook that could not be executed at all."""
+    result = _new_result(notebook_path)
+    result["status"] = "error"
+    result["error_message"] = message
+    result["end_time"] = result["start_time"]
+    return result
+
+
+def execute_notebook(notebook_path: Path, timeout: int, km: Optional[KernelManager] = None) -> Dict:
+    """
+    Execute a single notebook and return execution results.
+    
+    This is a module-level function so it can be pickled and run in worker processes.
+    
+    Args:
+        notebook_path: Path to the notebook file
+        timeout: Maximum time in seconds to wait for each cell to complete
+        km: Already running kernel to execute in; a fresh kernel is started if omitted
+        
+    Returns:
+        Dictionary containing execution results
+    """
+    logger = logging.getLogger(__name__)
+    result = _new_result(notebook_path)
+    
+    start_time = time.time()
+    executor = None
+    
+    try:
+        logger.info(f"Executing notebook: {result['notebook']}")
+        
+        # Read the notebook straight from a memory map, skipping the buffered text reader
+        with open(notebook_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            notebook = nbformat.reads(mm[:].decode("utf-8"), as_version=4)
+        
+        # Count total cells
+        result["total_cells"] = sum(1 for cell in notebook.cells if cell.cell_type == "code")
+        
+        # Create executor
+        executor = CountingExecutePreprocessor(
+            timeout=timeout,
+            kernel_name="python3",
+            allow_errors=False  # Stop on first error
+        )
+        
+        # Execute the notebook
+        executor.preprocess(notebook, {"metadata": {"path": str(notebook_path.parent)}}, km=km)
+        
+        result["status"] = "success"
+        logger.info(f"✅ Successfully executed: {result['notebook']}")
+        
+    except CellExecutionError as e:
+        result["status"] = "failed"
+        result["error_message"] = str(e)
+        logger.error(f"❌ Cell execution error in {result['notebook']}: {e}")
+        
+    except Exception as e:
+        result["status"] = "error"
+        result["error_message"] = str(e)
+        logger.error(f"💥 Unexpected error in {result['notebook']}: {e}")
+    
+    finally:
+        # Executed cells are counted during execution, so this is also accurate on failure
+        if executor is not None:
+            result["cells_executed"] = executor.executed_cells
+            # The executor leaves the client of a kernel it doesn't own open
+            if km is not None and executor.kc is not None:
+                executor.kc.stop_channels()
+        end_time = time.time()
+        result["execution_time"] = round(end_time - start_time, 2)
+        result["end_time"] = datetime.now().isoformat()
+    
+    return result
+
+
+def _prepare_shared_kernel(km: KernelManager, working_dir: Path, timeout: int):
+    """Clear the user namespace of a reused kernel and move it to the next notebook's directory."""
+    kc = km.client()
+    kc.start_channels()
+    try:
+        kc.wait_for_ready(timeout=60)
+        kc.execute_interactive(
+            f"%reset -f\n__import__('os').chdir({str(working_dir)!r})",
+            store_history=False,
+            timeout=timeout
+        )
+    finally:
+        kc.stop_channels()
+
+
+def execute_notebooks_in_kernel(notebook_paths: List[Path], timeout: int) -> List[Dict]:
+    """
+    Execute notebooks one after another in a single, reused kernel.
+    
+    Kernel startup and imports already loaded by earlier notebooks are paid for only
+    once. The user namespace is reset and the working directory changed between
+    notebooks, but imported modules and process-level state are shared.
+    
+    Args:
+        notebook_paths: Paths to the notebook files
+        timeout: Maximum time in seconds to wait for each cell to complete
+        
+    Returns:
+        List of execution results, in the same order as notebook_paths. Kernel
+        failures are reported as "error" results, so finished notebooks are kept.
+    """
+    logger = logging.getLogger(__name__)
+    km = KernelManager(kernel_name="python3")
+    try:
+        km.start_kernel()
+    except Exception as e:
+        logger.error(f"💥 Failed to start shared kernel: {e}")
+        return [_error_result(notebook_path, f"Failed to start shared kernel: {e}") for notebook_path in notebook_paths]
+    
+    results = []
+    try:
+        for notebook_path in notebook_paths:
+            try:
+                try:
+                    if not km.is_alive():
+                        km.restart_kernel(now=True)
+                    _prepare_shared_kernel(km, notebook_path.parent, timeout)
+                except Exception as e:
+                    logger.warning(f"Restarting shared kernel before {notebook_path.name}: {e}")
+                    km.restart_kernel(now=True)
+                    _prepare_shared_kernel(km, notebook_path.parent, timeout)
+            except Exception as e:
+                # Report this notebook and move on; the next one tries the kernel again
+                result = _error_result(notebook_path, f"Shared kernel unavailable: {e}")
+                logger.error(f"💥 Unexpected error in {result['notebook']}: {result['error_message']}")
+                results.append(result)
+                continue
+            
+            results.append(execute_notebook(notebook_path, timeout, km=km))
+    finally:
+        try:
+            km.shutdown_kernel(now=True)
+        except Exception as e:
+            logger.warning(f"Failed to shut down shared kernel: {e}")
+    
+    return results
+
+
 class NotebookTestRunner:
     """Main class for running notebook tests."""
     
-    def __init__(self, timeout: int = 600, output_format: str = "console"):
+    def __init__(
+        self,
+        timeout: int = 600,
+        output_format: str = "console",
+        workers: Optional[int] = None,
+        reuse_kernel: bool = False
+    ):
         """
         Initialize the notebook test runner.
         
         Args:
             timeout: Maximum time in seconds to wait for each notebook to complete
             output_format: Output format for results ("console", "json", "html")
+            workers: Number of notebooks to execute in parallel (default: CPU count)
+            reuse_kernel: Run each worker's notebooks in one persistent kernel
         """
         self.timeout = timeout
         self.output_format = output_format
+        self.workers = workers or os.cpu_count() or 1
+        self.reuse_kernel = reuse_kernel
         self.results = []
         self.start_time = datetime.now()
+        self.end_time = None
         
         # Setup logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('notebook_test_runner.log'),
-                logging.StreamHandler(sys.stdout)
-            ]
-        )
+        configure_logging()
         self.logger = logging.getLogger(__name__)
     
     def discover_notebooks(self, root_path: str = ".") -> List[Path]:
@@ -70,18 +298,10 @@ class NotebookTestRunner:
         Returns:
             List of notebook file paths
         """
-        notebook_paths = []
         root = Path(root_path).resolve()
         
-        # Find all .ipynb files, excluding checkpoints and build directories
-        for notebook_path in root.rglob("*.ipynb"):
-            # Skip checkpoint files and build directories
-            if ".ipynb_checkpoints" in str(notebook_path):
-                continue
-            if "build" in notebook_path.parts:
-                continue
-            
-            notebook_paths.append(notebook_path)
+        # Find all .ipynb files, skipping checkpoint, build and dependency directories
+        notebook_paths = list(walk_notebooks(root))
         
         # Sort notebooks by path for consistent execution order
         notebook_paths.sort()
@@ -102,69 +322,15 @@ class NotebookTestRunner:
         Returns:
             Dictionary containing execution results
         """
-        result = {
-            "notebook": str(notebook_path.relative_to(Path.cwd())),
-            "status": "unknown",
-            "execution_time": 0,
-            "start_time": datetime.now().isoformat(),
-            "end_time": None,
-            "error_message": None,
-            "cells_executed": 0,
-            "total_cells": 0
-        }
-        
-        start_time = time.time()
-        
-        try:
-            self.logger.info(f"Executing notebook: {result['notebook']}")
-            
-            # Read the notebook
-            with open(notebook_path, "r", encoding="utf-8") as f:
-                notebook = nbformat.read(f, as_version=4)
-            
-            # Count total cells
-            result["total_cells"] = len([cell for cell in notebook.cells if cell.cell_type == "code"])
-            
-            # Create executor
-            executor = ExecutePreprocessor(
-                timeout=self.timeout,
-                kernel_name="python3",
-                allow_errors=False  # Stop on first error
-            )
-            
-            # Execute the notebook
-            executor.preprocess(notebook, {"metadata": {"path": str(notebook_path.parent)}})
-            
-            # Count executed cells
-            result["cells_executed"] = len([
-                cell for cell in notebook.cells 
-                if cell.cell_type == "code" and cell.get("execution_count") is not None
-            ])
-            
-            result["status"] = "success"
-            self.logger.info(f"✅ Successfully executed: {result['notebook']}")
-            
-        except CellExecutionError as e:
-            result["status"] = "failed"
-            result["error_message"] = str(e)
-            self.logger.error(f"❌ Cell execution error in {result['notebook']}: {e}")
-            
-        except Exception as e:
-            result["status"] = "error"
-            result["error_message"] = str(e)
-            self.logger.error(f"💥 Unexpected error in {result['notebook']}: {e}")
-        
-        finally:
-            end_time = time.time()
-            result["execution_time"] = round(end_time - start_time, 2)
-            result["end_time"] = datetime.now().isoformat()
-        
-        return result
+        return execute_notebook(notebook_path, self.timeout)
     
     def run_all_notebooks(self, root_path: str = ".") -> List[Dict]:
         """
         Run all discovered notebooks and return results.
         
+        Notebooks run in parallel worker processes, except those listed in
+        SERIAL_NOTEBOOKS, which run one at a time afterwards.
+        
         Args:
             root_path: Root path to search for notebooks
             
@@ -177,15 +343,42 @@ class NotebookTestRunner:
             self.logger.warning("No notebooks found to execute")
             return []
         
-        self.logger.info(f"Starting execution of {len(notebooks)} notebooks")
+        root = Path(root_path).resolve()
+        serial = [nb for nb in notebooks if nb.relative_to(root).as_posix() in SERIAL_NOTEBOOKS]
+        parallel = [nb for nb in notebooks if nb not in serial]
+        
+        self.logger.info(
+            f"Starting execution of {len(notebooks)} notebooks "
+            f"({len(parallel)} in parallel with {self.workers} workers, {len(serial)} serially)"
+        )
         
-        for notebook_path in notebooks:
-            result = self.execute_notebook(notebook_path)
-            self.results.append(result)
+        results = {}
+        if self.reuse_kernel:
+            # One batch (and one persistent kernel) per worker
+            batches = [batch for batch in (parallel[i::self.workers] for i in range(self.workers)) if batch]
+            if batches:
+                with ProcessPoolExecutor(max_workers=len(batches), initializer=configure_logging) as pool:
+                    for batch, batch_results in zip(
+                        batches, pool.map(execute_notebooks_in_kernel, batches, itertools.repeat(self.timeout))
+                    ):
+                        results.update(zip(batch, batch_results))
+            
+            if serial:
+                results.update(zip(serial, execute_notebooks_in_kernel(serial, self.timeout)))
+        else:
+            if parallel:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=configure_logging) as pool:
+                    for notebook_path, result in zip(
+                        parallel, pool.map(execute_notebook, parallel, itertools.repeat(self.timeout))
+                    ):
+                        results[notebook_path] = result
             
-            # Add some spacing between notebook executions
-            time.sleep(1)
+            for notebook_path in serial:
+                results[notebook_path] = self.execute_notebook(notebook_path)
         
+        # Report results in discovery order
+        self.results.extend(results[notebook_path] for notebook_path in notebooks)
+        self.end_time = datetime.now()
         return self.results
     
     def generate_summary(self) -> Dict:
@@ -197,13 +390,18 @@ class NotebookTestRunner:
                 "failed": 0,
                 "errors": 0,
                 "total_execution_time": 0,
+                "cumulative_notebook_time": 0,
                 "overall_status": "no_notebooks"
             }
         
         successful = len([r for r in self.results if r["status"] == "success"])
         failed = len([r for r in self.results if r["status"] == "failed"])
         errors = len([r for r in self.results if r["status"] == "error"])
-        total_time = sum(r["execution_time"] for r in self.results)
+        # Notebooks run concurrently, so the total is the wall time of the run; the
+        # per-notebook times add up to more than that
+        end_time = self.end_time or datetime.now()
+        total_time = (end_time - self.start_time).total_seconds()
+        cumulative_time = sum(r["execution_time"] for r in self.results)
         
         overall_status = "success" if failed == 0 and errors == 0 else "failed"
         
@@ -213,9 +411,10 @@ class NotebookTestRunner:
             "failed": failed,
             "errors": errors,
             "total_execution_time": round(total_time, 2),
+            "cumulative_notebook_time": round(cumulative_time, 2),
             "overall_status": overall_status,
             "test_run_start": self.start_time.isoformat(),
-            "test_run_end": datetime.now().isoformat()
+            "test_run_end": end_time.isoformat()
         }
     
     def output_results(self):
@@ -240,6 +439,7 @@ class NotebookTestRunner:
         print(f"❌ Failed: {summary['failed']}")
         print(f"💥 Errors: {summary['errors']}")
         print(f"⏱️  Total execution time: {summary['total_execution_time']} seconds")
+        print(f"⏱️  Cumulative notebook time: {summary['cumulative_notebook_time']} seconds")
         print(f"🎯 Overall status: {summary['overall_status'].upper()}")
         
         print("\n📋 DETAILED RESULTS:")
@@ -270,7 +470,8 @@ class NotebookTestRunner:
     
     def _output_html(self, summary: Dict):
         """Output results in HTML format."""
-        html_content = f"""
+        # Collect the report in a list and join once, instead of repeated string concatenation
+        parts = [f"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -296,6 +497,7 @@ class NotebookTestRunner:
         <p><strong>Failed:</strong> <span class="failed">{summary['failed']}</span></p>
         <p><strong>Errors:</strong> <span class="error">{summary['errors']}</span></p>
         <p><strong>Total execution time:</strong> {summary['total_execution_time']} seconds</p>
+        <p><strong>Cumulative notebook time:</strong> {summary['cumulative_notebook_time']} seconds</p>
         <p><strong>Overall status:</strong> {summary['overall_status'].upper()}</p>
     </div>
     
@@ -308,13 +510,13 @@ class NotebookTestRunner:
             <th>Cells Executed</th>
             <th>Error Message</th>
         </tr>
-"""
+"""]
         
         for result in self.results:
             status_class = result["status"]
             error_msg = result["error_message"][:100] + "..." if result["error_message"] else ""
             
-            html_content += f"""
+            parts.append(f"""
         <tr>
             <td>{result['notebook']}</td>
             <td class="{status_class}">{result['status']}</td>
@@ -322,16 +524,16 @@ class NotebookTestRunner:
             <td>{result['cells_executed']}/{result['total_cells']}</td>
             <td>{error_msg}</td>
         </tr>
-"""
+""")
         
-        html_content += """
+        parts.append("""
     </table>
 </body>
 </html>
-"""
+""")
         
-        with open("notebook_test_results.html", "w") as f:
-            f.write(html_content)
+        with open("notebook_test_results.html", "w", encoding="utf-8") as f:
+            f.write("".join(parts))
         
         print("HTML report generated: notebook_test_results.html")
     
@@ -369,13 +571,26 @@ def main():
         default=".",
         help="Root path to search for notebooks (default: current directory)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of notebooks to execute in parallel (default: CPU count)"
+    )
+    parser.add_argument(
+        "--reuse-kernel",
+        action="store_true",
+        help="Run each worker's notebooks in one persistent kernel, resetting its namespace in between"
+    )
     
     args = parser.parse_args()
     
     # Create and run the test runner
     runner = NotebookTestRunner(
         timeout=args.timeout,
-        output_format=args.output_format
+        output_format=args.output_format,
+        workers=args.workers,
+        reuse_kernel=args.reuse_kernel
     )
     
     try: